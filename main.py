@@ -3,41 +3,117 @@ from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
 import aiohttp
 import asyncio
-from datetime import datetime
-import json
-
-# 辅助函数，用于安全地处理来自 asyncio.gather 的 AUR 信息响应
-async def process_aur_info_response(task_coro):
-
-    try:
-        # 等待 aiohttp 请求协程
-        resp = await task_coro
-        # 检查响应状态，如果响应是 4xx 或 5xx，则抛出 HTTPError
-        resp.raise_for_status()
-        # 将响应内容解析为 JSON
-        data = await resp.json()
-        # 确保即使 API 返回意外的数据结构，我们也能返回有用的信息
-        if isinstance(data, dict) and "results" in data and isinstance(data["results"], list):
-             return data
-        else:
-             # 记录警告日志，返回 None
-             logger.warning(f"意外的 AUR 信息响应结构: {data}")
-             return None # 或者抛出自定义错误
-    except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
-        # 记录警告日志，返回异常对象
-        logger.warning(f"处理一个 AUR 信息请求时失败: {e}")
-        return e # 返回异常对象以便后续过滤
-    except Exception as e: # 捕获意外错误
-        # 记录错误日志，包含堆栈跟踪，返回异常对象
-        logger.error(f"处理 AUR 信息请求时发生意外错误: {e}", exc_info=True)
-        return e
+from collections import defaultdict
+from dataclasses import dataclass
+import orjson
+from urllib.parse import quote
+
+# 请求超时时间
+_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# 官方仓库和 AUR 的接口地址
+_OFFICIAL_TMPL = "https://archlinux.org/packages/search/json/?name={name}"
+_AUR_SUGGEST = "https://aur.archlinux.org/rpc/v5/suggest/"
+_AUR_INFO = "https://aur.archlinux.org/rpc/v5/info?"
+
+# 官方仓库名称（小写）到搜索接口所用名称的映射
+_REPOS = {
+    "core": "Core",
+    "extra": "Extra",
+    "multilib": "Multilib",
+    "core-testing": "Core-Testing",
+    "extra-testing": "Extra-Testing",
+    "multilib-testing": "Multilib-Testing",
+}
+
+# 官方仓库结果的消息模板，缺失的字段显示为 N/A
+_MSG_TMPL = (
+    "仓库：{repo}\n"
+    "包名：{pkgname}\n"
+    "版本：{pkgver}\n"
+    "描述：{pkgdesc}\n"
+    "打包：{packager}\n"
+    "上游：{url}\n"
+    "更新日期：{last_update}"
+)
+
+# 需要从 AUR 包信息中提取的字段：(键名, AurPackage 属性名, 默认值, 类型转换)
+_AUR_FIELDS = (
+    ("Name", "name", "N/A", str),
+    ("Version", "version", "N/A", str),
+    ("Description", "description", "N/A", str),
+    ("LastModified", "last_modified", None, float), # Unix 时间戳
+    ("OutOfDate", "out_of_date", None, float), # Unix 时间戳，未过期时为 None
+    ("NumVotes", "num_votes", 0.0, float),
+    ("Maintainer", "maintainer", "孤儿包", str), # 孤儿包的 Maintainer 为 null
+    ("CoMaintainers", "co_maintainers", (), tuple),
+    ("URL", "url", "无", str),
+)
+
+# AUR 建议最多取前若干个获取详细信息
+_AUR_MAX_SUGGESTIONS = 5
+
+# 辅助函数，请求指定 URL 并将响应解析为 JSON，便于作为任务并发执行
+async def fetch_json(session, url):
+    async with session.get(url) as resp:
+        resp.raise_for_status() # 检查 HTTP 错误（4xx, 5xx）
+        return orjson.loads(await resp.read())
+
+# 辅助函数，通过一次多参数 info 请求获取多个 AUR 包的信息，返回 AurPackage 列表
+async def fetch_aur_info(session, names):
+    aur_info_url = _AUR_INFO + "&".join(f"arg[]={quote(name)}" for name in names)
+    logger.debug(f"AUR 信息 URL: {aur_info_url}")
+    search_map = await fetch_json(session, aur_info_url)
+    # API 返回一个列表，包含所有找到的包
+    results = search_map.get("results") if isinstance(search_map, dict) else None
+    if not isinstance(results, list):
+        logger.warning(f"意外的 AUR 信息响应结构: {search_map}")
+        return []
+    return [AurPackage.from_aur_dict(p) for p in results]
+
+@dataclass(slots=True)
+class AurPackage:
+    '''AUR 包信息中插件实际用到的字段，丢弃 Depends、MakeDepends 等其余内容。'''
+    name: str
+    version: str
+    description: str
+    last_modified: float | None
+    out_of_date: float | None
+    num_votes: float
+    maintainer: str
+    co_maintainers: tuple
+    url: str
+
+    @classmethod
+    def from_aur_dict(cls, pkg_info):
+        '''按 _AUR_FIELDS 一次性提取并转换 AUR 包信息，缺失、为空或无效的值使用默认值。'''
+        fields = {}
+        for key, attr, default, conv in _AUR_FIELDS:
+            raw = pkg_info.get(key)
+            try:
+                fields[attr] = conv(raw) if raw else default
+            except (ValueError, TypeError):
+                fields[attr] = default
+        return cls(**fields)
 
 
 @register("pkg", "liyp", "一个查询Archlinux包信息插件", "0.0.1")
 class PkgPlugin(Star):
     def __init__(self, context: Context):
         super().__init__(context)
-    
+        # 持久化的 ClientSession，跨命令复用连接池（keep-alive）和 DNS 缓存
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        '''获取持久化的 ClientSession，首次使用时在事件循环中惰性创建。'''
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=75)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=_TIMEOUT,
+            )
+        return self._session
+
     @filter.command("pkg")
     async def search_pkg(self, event: AstrMessageEvent):
         '''搜索 Arch Linux 官方仓库和 AUR 的软件包. 使用方法: pkg <packagename> [repo]'''
@@ -49,209 +125,150 @@ class PkgPlugin(Star):
         pkg_name = args[1]
         repo = None
         if len(args) > 2 and args[2]:
-            # 正确化 repo 的首字母大写（例如，core -> Core, extra -> Extra）
-            
-            repo = args[2][0].upper() + args[2][1:]
+            # 转换为搜索接口所用的仓库名（例如，core -> Core, extra -> Extra），无效的仓库名直接提示
+            repo = _REPOS.get(args[2].lower())
+            if repo is None:
+                yield event.plain_result(f"未知的仓库 '{args[2]}'，可选：{', '.join(_REPOS)}")
+                return
 
-        timeout = aiohttp.ClientTimeout(total=10) # 超时时间
+        session = self._get_session()
 
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            # 1. 首先尝试搜索官方仓库
-            search_url = f"https://archlinux.org/packages/search/json/?name={pkg_name}"
-            if repo:
-                search_url += f"&repo={repo}"
+        # 1. 首先尝试搜索官方仓库
+        search_url = _OFFICIAL_TMPL.format(name=pkg_name)
+        if repo:
+            search_url += f"&repo={repo}"
 
-            logger.debug(f"Pkg search URL: {search_url}")
+        logger.debug(f"Pkg search URL: {search_url}")
 
-            try:
-                async with session.get(search_url) as resp:
-                    resp.raise_for_status() # 检查 HTTP 错误（4xx, 5xx）
-                    data = await resp.json()
-                    results = data.get("results", [])
+        # 同时预先按包名直接查找 AUR，官方仓库未命中时无需再等待一次往返
+        official_task = asyncio.create_task(fetch_json(session, search_url))
+        aur_exact_task = asyncio.create_task(fetch_aur_info(session, [pkg_name]))
 
-                    if results:
-                        # 在官方仓库中找到结果，格式化并返回第一个结果
-                        result = results[0]
-                        # 格式化时间戳
-                        last_update_str = "N/A"
-                        if result.get("last_update"):
-                            try:
-                                # 尝试解析 ISO 8601 格式
-                                dt_obj = datetime.fromisoformat(result["last_update"].replace("Z", "+00:00"))
-                                last_update_str = dt_obj.strftime('%Y-%m-%d %H:%M:%S')
-                            except ValueError:
-                                logger.warning(f"无法解析官方仓库的时间戳: {result.get('last_update')}")
-                                # 如果解析失败，回退到原始字符串
-                                last_update_str = result.get('last_update', 'N/A').replace("T", " ").replace("Z", "")
-
-                        msg = (
-                            f"仓库：{result.get('repo', 'N/A')}\n"
-                            f"包名：{result.get('pkgname', 'N/A')}\n"
-                            f"版本：{result.get('pkgver', 'N/A')}\n"
-                            f"描述：{result.get('pkgdesc', 'N/A')}\n"
-                            f"打包：{result.get('packager', 'N/A')}\n"
-                            f"上游：{result.get('url', 'N/A')}\n"
-                            f"更新日期：{last_update_str}"
-                        )
-                        yield event.plain_result(msg)
-                        return # 找到结果，结束
-
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                logger.error(f"获取官方仓库包信息时出错: '{pkg_name}': {e}")
-                yield event.plain_result(f"查询官方仓库时网络错误或超时！")
-                return # 网络错误，不继续搜索 AUR
-            except json.JSONDecodeError as e:
-                 logger.error(f"解析官方仓库搜索的 JSON 时出错: '{pkg_name}': {e}")
-                 yield event.plain_result("无法解析官方仓库的响应！")
-                 return
-            except Exception as e: # 捕获处理过程中的其他错误
-                logger.error(f"处理官方仓库数据时出错: '{pkg_name}': {e}", exc_info=True)
-                yield event.plain_result("处理官方仓库数据时出错！")
-                return
+        try:
+            data = await official_task
+            results = data.get("results", [])
 
-            # 2. 如果在官方仓库中未找到（或搜索失败但决定继续），尝试 AUR
-            logger.info(f"Package '{pkg_name}' not found in official repos (or specified repo '{repo}'). Checking AUR.")
+            if results:
+                # 在官方仓库中找到结果，格式化并返回第一个结果
+                result = results[0]
+                # 格式化时间戳，ISO 8601（如 2024-03-15T12:34:56.123Z）截取到秒即可
+                last_update_str = result["last_update"][:19].replace("T", " ") if result.get("last_update") else "N/A"
 
-            # 2a. 从 AUR 获取建议
-            aur_suggest_url = f"https://aur.archlinux.org/rpc/v5/suggest/{pkg_name}"
+                msg = _MSG_TMPL.format_map(defaultdict(lambda: "N/A", result, last_update=last_update_str))
+                aur_exact_task.cancel() # 官方仓库已命中，不再需要 AUR 信息
+                yield event.plain_result(msg)
+                return # 找到结果，结束
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            aur_exact_task.cancel()
+            logger.error(f"获取官方仓库包信息时出错: '{pkg_name}': {e}")
+            yield event.plain_result(f"查询官方仓库时网络错误或超时！")
+            return # 网络错误，不继续搜索 AUR
+        except orjson.JSONDecodeError as e:
+             aur_exact_task.cancel()
+             logger.error(f"解析官方仓库搜索的 JSON 时出错: '{pkg_name}': {e}")
+             yield event.plain_result("无法解析官方仓库的响应！")
+             return
+        except Exception as e: # 捕获处理过程中的其他错误
+            aur_exact_task.cancel()
+            logger.error(f"处理官方仓库数据时出错: '{pkg_name}': {e}", exc_info=True)
+            yield event.plain_result("处理官方仓库数据时出错！")
+            return
+
+        # 2. 如果在官方仓库中未找到（或搜索失败但决定继续），尝试 AUR
+        logger.info(f"Package '{pkg_name}' not found in official repos (or specified repo '{repo}'). Checking AUR.")
+        target_pkg_info = None
+
+        # 2a. 按包名直接查找 AUR 信息（请求已与官方仓库搜索并发发起）
+        try:
+            results = await aur_exact_task
+            if results:
+                target_pkg_info = results[0]
+        except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+            logger.error(f"获取或解析 AUR 信息时出错: '{pkg_name}': {e}")
+        except Exception as e:
+            logger.error(f"获取 AUR 信息时发生意外错误: '{pkg_name}': {e}", exc_info=True)
+
+        if target_pkg_info is None:
+            # 2b. 没有直接命中，从 AUR 获取建议
+            logger.info(f"AUR 中没有名为 '{pkg_name}' 的包，尝试 AUR 建议。")
+            aur_suggest_url = _AUR_SUGGEST + pkg_name
             logger.debug(f"AUR suggest URL: {aur_suggest_url}")
             suggestions = []
             try:
-                async with session.get(aur_suggest_url) as resp:
-                    resp.raise_for_status()
-                    # suggest 端点返回一个简单的字符串列表
-                    suggestions = await resp.json()
-                    if not isinstance(suggestions, list):
-                         logger.error(f"意外的 AUR 建议响应类型: {type(suggestions)}")
-                         suggestions = [] # 视为没有建议
-
-            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+                # suggest 端点返回一个简单的字符串列表
+                suggestions = await fetch_json(session, aur_suggest_url)
+                if not isinstance(suggestions, list):
+                     logger.error(f"意外的 AUR 建议响应类型: {type(suggestions)}")
+                     suggestions = [] # 视为没有建议
+
+            except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
                 logger.error(f"获取或解析 AUR 建议时出错: '{pkg_name}': {e}")
                 # 不在这里抛出错误，意味着无法使用建议
             except Exception as e:
                 logger.error(f"AUR 建议期间发生意外错误: '{pkg_name}': {e}", exc_info=True)
 
-            if not suggestions:
-                 # 即使建议失败或返回为空，尝试直接信息查找
-                 logger.info(f"没有 AUR 建议 for '{pkg_name}'，尝试直接信息查找。")
-                 suggestions = [pkg_name] # 假设原始名称是唯一的建议
-
-            # 2b. 获取建议的信息并找到最佳匹配
-            aur_info_base_url = "https://aur.archlinux.org/rpc/v5/info/"
-            target_pkg_info = None
+            # 只保留 "<包名>-" 前缀的相关建议（没有时退回全部建议），名称更短的排在前面，并限制数量
+            related = [s for s in suggestions if s.startswith(pkg_name + "-")]
+            suggestions = sorted(related or suggestions, key=lambda s: (not s.startswith(pkg_name), len(s)))
+            suggestions = suggestions[:_AUR_MAX_SUGGESTIONS]
 
-            if len(suggestions) == 1 or suggestions[0] == pkg_name:
-                # 只有一个建议（或直接匹配），直接获取其信息
-                target_name = suggestions[0]
-                aur_info_url = f"{aur_info_base_url}{target_name}"
-                logger.debug(f"AUR 单个/直接信息 URL: {aur_info_url}")
+            # 2c. 通过一次多参数 info 请求获取所有建议的信息，选择投票数最高的
+            if suggestions:
                 try:
-                    async with session.get(aur_info_url) as resp:
-                         resp.raise_for_status()
-                         search_map = await resp.json()
-                         if search_map.get("results") and isinstance(search_map["results"], list) and len(search_map["results"]) > 0:
-                             target_pkg_info = search_map["results"][0]
-                         else:
-                             logger.info(f"AUR 信息查找 for '{target_name}' 返回无结果。")
-                except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
-                     logger.error(f"获取或解析单个 AUR 信息时出错: '{target_name}': {e}")
+                    results = await fetch_aur_info(session, suggestions)
+                    if results:
+                        target_pkg_info = max(results, key=lambda p: p.num_votes)
+                    else:
+                        logger.info(f"无法根据建议确定最佳 AUR 包 for '{pkg_name}'。")
+                except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+                    logger.error(f"获取或解析 AUR 信息时出错: '{pkg_name}': {e}")
                 except Exception as e:
-                     logger.error(f"获取单个 AUR 信息时发生意外错误: '{target_name}': {e}", exc_info=True)
-
-            else:
-                # 多个建议：并发获取所有建议的信息，选择投票数最高的
-                logger.info(f"找到多个 AUR 建议 ({len(suggestions)})，获取所有信息...")
-                fetch_tasks = []
-                # 为每个建议创建获取信息的任务
-                for suggestion in suggestions:
-                     fetch_tasks.append(process_aur_info_response(session.get(f"{aur_info_base_url}{suggestion}")))
-
-                # 并发运行所有获取任务
-                aur_responses = await asyncio.gather(*fetch_tasks)
-
-                best_result = None
-                max_votes = -1.0 # 使用 -1 确保即使只有一个包投票数为 0 也会被选中
-
-                for result_data in aur_responses:
-                     # 跳过处理过程中出现错误或 None 的结果
-                     if isinstance(result_data, Exception) or result_data is None:
-                          continue
-
-                     # Go 代码假设 'results' 总是至少有一个项目。更安全的做法是检查。
-                     if result_data.get("results"):
-                         # API 返回一个列表，即使对于单个包信息请求也是如此
-                         pkg_info = result_data["results"][0]
-                         # 安全获取 NumVotes，默认为 0.0 如果缺失或不是数字
-                         try:
-                             votes = float(pkg_info.get("NumVotes", 0.0) or 0.0)
-                         except (ValueError, TypeError):
-                             votes = 0.0
-                         if votes > max_votes:
-                             max_votes = votes
-                             best_result = pkg_info
-
-                if best_result:
-                    target_pkg_info = best_result
-                else:
-                    logger.info(f"无法根据建议确定最佳 AUR 包 for '{pkg_name}'。")
-            
-            # 3. 格式化并返回 AUR 结果（如果找到）
-            if target_pkg_info:
-                maintainer = target_pkg_info.get("Maintainer") or "孤儿包"
-                out_of_date_ts = target_pkg_info.get("OutOfDate") # Unix 时间戳（float 或 int）或 None
-                out_of_date_str = ""
-                if out_of_date_ts:
-                    try:
-                        out_of_date_dt = datetime.fromtimestamp(float(out_of_date_ts))
-                        out_of_date_str = f"过期时间：{out_of_date_dt.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    except (ValueError, TypeError, OSError):
-                         logger.warning(f"无效的 AUR OutOfDate 时间戳: {out_of_date_ts}")
-
-                upstream_url = target_pkg_info.get("URL") or "无"
-                # CoMaintainers 可能缺失或为 None，默认为空列表
-                co_maintainers = target_pkg_info.get("CoMaintainers") or []
-                co_maintainers_str = ""
-                if co_maintainers and isinstance(co_maintainers, list):
-                     # 确保元素是字符串后再连接
-                     co_maintainers_str = f" ( {' '.join(map(str, co_maintainers))} )"
-
-                last_modified_ts = target_pkg_info.get("LastModified")
-                last_modified_str = "N/A"
-                if last_modified_ts:
-                    try:
-                         last_modified_dt = datetime.fromtimestamp(float(last_modified_ts))
-                         last_modified_str = last_modified_dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except (ValueError, TypeError, OSError):
-                         logger.warning(f"无效的 AUR LastModified 时间戳: {last_modified_ts}")
-
-                num_votes = 0.0
+                    logger.error(f"获取 AUR 信息时发生意外错误: '{pkg_name}': {e}", exc_info=True)
+
+        # 3. 格式化并返回 AUR 结果（如果找到）
+        if target_pkg_info:
+            from datetime import datetime # 仅格式化 AUR 的 Unix 时间戳时需要，官方仓库结果无需导入
+            fromtimestamp = datetime.fromtimestamp # 缓存为局部变量，避免重复的属性查找
+            out_of_date_str = ""
+            if target_pkg_info.out_of_date:
                 try:
-                    num_votes = float(target_pkg_info.get("NumVotes", 0.0) or 0.0)
-                except (ValueError, TypeError):
-                    pass # 保持 num_votes 为 0.0
-
-                pkg_display_name = target_pkg_info.get('Name', 'N/A')
-
-                msg = (
-                     f"仓库：AUR\n"
-                     f"包名：{pkg_display_name}\n"
-                     f"版本：{target_pkg_info.get('Version', 'N/A')}\n"
-                     f"描述：{target_pkg_info.get('Description', 'N/A')}\n"
-                     f"维护者：{maintainer}{co_maintainers_str}\n"
-                     f"上游：{upstream_url}\n"
-                     f"{out_of_date_str}" # 仅在时间戳有效时包含此行
-                     f"更新时间：{last_modified_str}\n"
-                     f"投票：{num_votes:.0f}\n" # 将浮点数格式化为整数字符串
-                     f"AUR 链接：https://aur.archlinux.org/packages/{pkg_display_name}"
-                 )
-                yield event.plain_result(msg)
-                return
+                    out_of_date_str = f"过期时间：{fromtimestamp(target_pkg_info.out_of_date).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                except (ValueError, OverflowError, OSError):
+                    logger.warning(f"无效的 AUR OutOfDate 时间戳: {target_pkg_info.out_of_date}")
+
+            co_maintainers_str = ""
+            if target_pkg_info.co_maintainers:
+                 # 确保元素是字符串后再连接
+                 co_maintainers_str = f" ( {' '.join(map(str, target_pkg_info.co_maintainers))} )"
+
+            last_modified_str = "N/A"
+            if target_pkg_info.last_modified:
+                try:
+                    last_modified_str = fromtimestamp(target_pkg_info.last_modified).strftime('%Y-%m-%d %H:%M:%S')
+                except (ValueError, OverflowError, OSError):
+                    logger.warning(f"无效的 AUR LastModified 时间戳: {target_pkg_info.last_modified}")
+
+            msg = (
+                 f"仓库：AUR\n"
+                 f"包名：{target_pkg_info.name}\n"
+                 f"版本：{target_pkg_info.version}\n"
+                 f"描述：{target_pkg_info.description}\n"
+                 f"维护者：{target_pkg_info.maintainer}{co_maintainers_str}\n"
+                 f"上游：{target_pkg_info.url}\n"
+                 f"{out_of_date_str}" # 仅在时间戳有效时包含此行
+                 f"更新时间：{last_modified_str}\n"
+                 f"投票：{target_pkg_info.num_votes:.0f}\n" # 将浮点数格式化为整数字符串
+                 f"AUR 链接：https://aur.archlinux.org/packages/{target_pkg_info.name}"
+             )
+            yield event.plain_result(msg)
+            return
+
+        # 4. 如果在官方仓库或 AUR 中未找到
+        yield event.plain_result(f"没有在官方仓库或 AUR 中找到名为 '{pkg_name}' 的相关软件。")
 
-            # 4. 如果在官方仓库或 AUR 中未找到
-            yield event.plain_result(f"没有在官方仓库或 AUR 中找到名为 '{pkg_name}' 的相关软件。")
     async def terminate(self):
-        '''可选：清理资源，例如在 __init__ 中创建的持久化 ClientSession。'''
+        '''清理资源，关闭持久化的 ClientSession。'''
         logger.info("PkgPlugin 正在终止。")
-        # 如果你在 __init__ 中创建了 self.session，请在这里关闭它：
-        # if hasattr(self, 'session') and self.session:
-        #     await self.session.close()
\ No newline at end of file
+        if self._session and not self._session.closed:
+            await self._session.close()